@@ -1,9 +1,24 @@
 
-from flask import Flask, request, jsonify, render_template_string, redirect
+import time
+_phase_start, STARTUP_PHASES = time.perf_counter(), []
+
+def mark_phase(name):
+    """Record the time spent since the previous mark; reported by `python app.py --profile-startup`"""
+    global _phase_start
+    now = time.perf_counter()
+    STARTUP_PHASES.append((name, now - _phase_start))
+    _phase_start = now
+
+from flask import Blueprint, Flask, Response, request, jsonify, redirect
 from flask_cors import CORS
-import requests, os, json
+import requests, os, json, math, socket, sqlite3, threading, argparse
 from textwrap import dedent
 from functools import wraps
+from contextlib import contextmanager
+
+try: import fcntl  # Cross-process file locks; unavailable on Windows
+except ImportError: fcntl = None
+mark_phase('import dependencies')
 
 
 
@@ -12,11 +27,31 @@ class Config:
     HISTORY_DIR, DEFAULT_MODEL = "agent_history", "huihui_ai/llama3.2-abliterate"
     DEFAULT_TEMP, DEFAULT_MAX_TOKENS, DEFAULT_TOP_P = 0.7, 500, 0.9
     SUMMARY_MAX_TOKENS = 200  # Control summary length
+    REQUEST_DEADLINE = 120  # Max seconds a generation may run; clients can shorten it per request
+    DEADLINE_HEADER = 'X-Request-Timeout'
+    OLLAMA_HOST = os.environ.get('OLLAMA_URL', OLLAMA_HOST)
+    STATE_DB = os.environ.get('AGENT_STATE_DB')  # SQLite file shared by all workers; unset keeps JSON files
 
 def ensure_directory_exists(path):
     os.makedirs(path, exist_ok=True)
     
 sanitize_filename = lambda name: name.replace(" ", "_").replace("/", "_").lower()
+optional_int = lambda value: int(value) if value not in (None, '') else None
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock held across worker processes while `path` is read-modified-written"""
+    with open(f"{path}.lock", 'a') as lock:
+        if fcntl: fcntl.flock(lock, fcntl.LOCK_EX)
+        yield  # Released when the lock file is closed
+
+def write_atomic(path, content):
+    """Write through a temp file so other workers never read a half-written file"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f: f.write(content)
+    os.replace(tmp, path)
+
+write_json_atomic = lambda path, data: write_atomic(path, json.dumps(data, indent=4))
 
 class Agent:
     def __init__(self, data):
@@ -26,20 +61,14 @@ class Agent:
         self.temperature = float(data.get('temperature', Config.DEFAULT_TEMP))
         self.max_tokens = int(data.get('max_tokens', Config.DEFAULT_MAX_TOKENS))
         self.top_p = float(data.get('top_p', Config.DEFAULT_TOP_P))
+        # Runtime options; None leaves the Ollama/model default in place
+        for attr in OllamaOptions.RUNTIME_KEYS: setattr(self, attr, optional_int(data.get(attr)))
         self.history = self.load_history()
         self.context_summary = data.get('context_summary', "")
         
-        # Load the existing summary from file if available
+        # Load the existing summary from the store if available
         self.load_summary()
 
-    @property
-    def history_file(self):
-        return f"{Config.HISTORY_DIR}/{sanitize_filename(self.name)}_history.json"
-    
-    @property
-    def summary_file(self):
-        return f"{Config.HISTORY_DIR}/{sanitize_filename(self.name)}_summary.txt"
-
     def get_system_message(self, topic, context_summary):
         return dedent(f"""
             You are {self.name}, {self.role} expert in {self.expertise}.
@@ -72,42 +101,39 @@ class Agent:
         """).strip()
 
     def load_history(self):
-        try:
-            return json.load(open(self.history_file)) if os.path.exists(self.history_file) else []
+        try: return get_store().load_history(self.name)
         except Exception as e: print(f"Error loading history: {e}"); return []
     
     def load_summary(self):
-        """Load the existing summary from file"""
+        """Load the existing summary from the store"""
         try:
-            if os.path.exists(self.summary_file):
-                with open(self.summary_file, 'r') as f:
-                    self.context_summary = f.read().strip()
+            if (summary := get_store().load_summary(self.name)) is not None:
+                self.context_summary = summary
         except Exception as e:
-            print(f"Error loading summary file: {e}")
+            print(f"Error loading summary: {e}")
             # If there's an error, keep using the summary from the agent data
 
     def save_summary(self):
-        """Save the current summary to file"""
-        try:
-            with open(self.summary_file, 'w') as f:
-                f.write(self.context_summary)
-        except Exception as e:
-            print(f"Error saving summary: {e}")
+        """Save the current summary to the store"""
+        try: get_store().save_summary(self.name, self.context_summary)
+        except Exception as e: print(f"Error saving summary: {e}")
 
     def save_history(self):
-        json.dump(self.history, open(self.history_file, 'w'), indent=4)
+        get_store().save_history(self.name, self.history)
+
+    def refresh(self):
+        """Re-read history and summary that another request or worker may have changed"""
+        self.history, self.context_summary = self.load_history(), ""
+        self.load_summary()
 
     def reset_history(self):
         self.history = []
         self.context_summary = ""
         self.save_history()
         
-        # Also delete the summary file when resetting history
-        if os.path.exists(self.summary_file):
-            try:
-                os.remove(self.summary_file)
-            except Exception as e:
-                print(f"Error removing summary file: {e}")
+        # Also delete the summary when resetting history
+        try: get_store().delete_summary(self.name)
+        except Exception as e: print(f"Error removing summary: {e}")
         
     def update_summary(self):
         """Generate a new context summary from the conversation history"""
@@ -154,15 +180,13 @@ class Agent:
         print(summary_prompt)
         # Get updated summary from model
         try:
-            resp = requests.post(f'{Config.OLLAMA_HOST}/api/chat', json={
+            resp = OllamaService.http().post(f'{Config.OLLAMA_HOST}/api/chat', json={
                 'model': self.model,
                 'messages': summary_prompt,
                 'stream': False,
-                'options': {
-                    'temperature': 0.1,  # Lower temp for more focused summary
-                    'max_tokens': Config.SUMMARY_MAX_TOKENS
-                }
-            })
+                # Lower temp for more focused summary; same runtime options so Ollama doesn't reload the model
+                'options': OllamaOptions.for_agent(self, temperature=0.1, num_predict=Config.SUMMARY_MAX_TOKENS)
+            }, timeout=Config.REQUEST_DEADLINE)
             if resp.ok:
                 new_summary = resp.json()['message']['content']
                 self.context_summary = new_summary
@@ -174,52 +198,517 @@ class Agent:
         
         return current_summary  # Return existing summary if there was an error
 
+    def build_messages(self, message):
+        """Add the user message to history and build the minimal prompt for the model"""
+        self.history.append({"role": "user", "content": message})
+        
+        # Get current topic from the latest message
+        topic = message[:50] + "..." if len(message) > 50 else message
+        
+        # Only include the last few messages for context + system prompt with summary
+        return [
+            {"role": "system", "content": self.get_system_message(topic, self.context_summary)},
+            *(self.history[-3:] if len(self.history) >= 3 else self.history)
+        ]
+
+    def record_response(self, response):
+        """Store the model reply, refreshing the summary every few messages"""
+        if len(self.history) % 3 == 0:  # Update only every 3 messages
+            self.update_summary()
+        self.history.append({"role": "assistant", "content": response})
+        # Append just this exchange so concurrent workers don't overwrite each other's turns
+        get_store().append_history(self.name, self.history[-2:])
+
     def to_dict(self):
         return {k: getattr(self, k) for k in ['name', 'role', 'temperament', 
             'expertise', 'communication_style', 'model', 'temperature', 
-            'max_tokens', 'top_p']}
+            'max_tokens', 'top_p', *OllamaOptions.RUNTIME_KEYS]}
             
     from_dict = classmethod(lambda cls, data: cls(data))
 
 class AgentManager:
-    @staticmethod
-    def load_all():
-        return [Agent.from_dict(d) for d in json.load(open(Config.AGENTS_FILE))] \
-            if os.path.exists(Config.AGENTS_FILE) else []
+    _cache = (None, [])  # (store version, agent configs), shared by this worker's threads
+
+    @classmethod
+    def load_configs(cls):
+        """Agent configs, re-read only after some worker has changed them"""
+        version = get_store().agents_version()
+        if cls._cache[0] != version:
+            cls._cache = (version, get_store().load_agents())
+        return cls._cache[1]
+
+    @classmethod
+    def load_all(cls):
+        return [Agent.from_dict(d) for d in cls.load_configs()]
+
+    @classmethod
+    def get(cls, name):
+        """Build just the named agent, without loading every other agent's history"""
+        data = next((d for d in cls.load_configs() if d['name'] == name), None)
+        return Agent.from_dict(data) if data else None
     
     @staticmethod
     def save_all(agents):
-        json.dump([a.to_dict() for a in agents], open(Config.AGENTS_FILE, 'w'), indent=4)
+        get_store().save_agents([a.to_dict() for a in agents])
+
+    @staticmethod
+    def add(agent):
+        get_store().add_agent(agent.to_dict())
+
+    @staticmethod
+    def remove(name):
+        get_store().remove_agent(name)
+
+class FileStore:
+    """Default state layout: agents.json plus per-agent files in HISTORY_DIR.
     
+    Writes are atomic and read-modify-write cycles hold a file lock, so several
+    workers on one host can share it."""
+    def __init__(self):
+        ensure_directory_exists(Config.HISTORY_DIR)
+        self._metrics, self._metrics_lock = {}, threading.Lock()  # Per process; files have no shared counter
+
+    history_file = staticmethod(lambda name: f"{Config.HISTORY_DIR}/{sanitize_filename(name)}_history.json")
+    summary_file = staticmethod(lambda name: f"{Config.HISTORY_DIR}/{sanitize_filename(name)}_summary.txt")
+
+    def agents_version(self):
+        # Every write replaces the file, so the inode changes even when the mtime tick doesn't
+        try: return (stat := os.stat(Config.AGENTS_FILE)).st_ino, stat.st_mtime_ns
+        except FileNotFoundError: return 0
+
+    def load_agents(self):
+        return json.load(open(Config.AGENTS_FILE)) if os.path.exists(Config.AGENTS_FILE) else []
+
+    def save_agents(self, configs):
+        with file_lock(Config.AGENTS_FILE): write_json_atomic(Config.AGENTS_FILE, configs)
+
+    def add_agent(self, config):
+        with file_lock(Config.AGENTS_FILE):
+            configs = self.load_agents()
+            if any(c['name'] == config['name'] for c in configs):
+                raise ValueError("Agent exists")
+            write_json_atomic(Config.AGENTS_FILE, configs + [config])
+
+    def remove_agent(self, name):
+        with file_lock(Config.AGENTS_FILE):
+            configs = self.load_agents()
+            if not any(c['name'] == name for c in configs):
+                raise ValueError("Agent not found")
+            write_json_atomic(Config.AGENTS_FILE, [c for c in configs if c['name'] != name])
+            # Delete both history and summary files before anyone can recreate the agent
+            for path in (self.history_file(name), self.summary_file(name)):
+                if os.path.exists(path): os.remove(path)
+
+    @contextmanager
+    def _agent_file(self, name, path):
+        """Lock one of an agent's files, refusing if the agent was deleted so a stale writer can't recreate it"""
+        with file_lock(Config.AGENTS_FILE):
+            if not any(c['name'] == name for c in self.load_agents()):
+                raise ValueError("Agent not found")
+            with file_lock(path): yield path
+
+    def load_history(self, name):
+        path = self.history_file(name)
+        return json.load(open(path)) if os.path.exists(path) else []
+
+    def save_history(self, name, history):
+        with self._agent_file(name, self.history_file(name)) as path: write_json_atomic(path, history)
+
+    def append_history(self, name, entries):
+        with self._agent_file(name, self.history_file(name)) as path: write_json_atomic(path, self.load_history(name) + entries)
+
+    def load_summary(self, name):
+        if os.path.exists(path := self.summary_file(name)):
+            with open(path, 'r') as f: return f.read().strip()
+
+    def save_summary(self, name, summary):
+        with self._agent_file(name, self.summary_file(name)) as path: write_atomic(path, summary)
+
+    def delete_summary(self, name):
+        with file_lock(path := self.summary_file(name)):
+            if os.path.exists(path): os.remove(path)
+
+    def incr_metric(self, name, amount):
+        with self._metrics_lock: self._metrics[name] = self._metrics.get(name, 0) + amount
+
+    def load_metrics(self):
+        with self._metrics_lock: return dict(self._metrics)
+
+class SqliteStore:
+    """Shared state for multi-worker deployments; SQLite serialises writers across processes
+    and `agents_version` tells every worker when its cached agent configs are stale."""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS agents (position INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, agent TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS history_agent ON history (agent, id);
+        CREATE TABLE IF NOT EXISTS summaries (agent TEXT PRIMARY KEY, content TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS metrics (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta VALUES ('agents_version', 0);
+    """
+
+    BUSY_TIMEOUT = 0.05  # SQLite's own wait for another writer blocks the whole process, so keep it short
+    LOCK_WAIT = 30  # and retry from Python for up to this long
+
+    def __init__(self, path):
+        self.path = path
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)  # e.g. gunicorn --preload
+        with self._connection(): pass
+
+    def _reset(self):
+        self._conn, self._lock = None, threading.Lock()
+
+    @contextmanager
+    def _connection(self):
+        """This process's single connection, used by one thread or greenlet at a time.
+        
+        Under gevent, threading.local is per greenlet, so per-thread connections would
+        mean one per WebSocket; the lock is gevent-aware and yields while waiting."""
+        with self._lock:
+            if self._conn is None:
+                db = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+                self._retry(lambda: db.execute('PRAGMA journal_mode=WAL'))
+                self._retry(lambda: db.executescript(self.SCHEMA))
+                self._conn = db
+            yield self._conn
+
+    def _retry(self, statement):
+        """Run `statement`, waiting out other processes' writes with time.sleep, which gevent
+        turns into a yield, rather than in SQLite's busy handler, which blocks the event loop"""
+        deadline = time.monotonic() + self.LOCK_WAIT
+        while True:
+            try: return statement()
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or time.monotonic() > deadline: raise
+                time.sleep(self.BUSY_TIMEOUT)
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as db:
+            self._retry(lambda: db.execute('BEGIN IMMEDIATE'))
+            try: yield db
+            except BaseException: db.execute('ROLLBACK'); raise
+            else: db.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        with self._connection() as db: return db.execute(sql, params).fetchall()
+
+    def _bump_agents_version(self, db):
+        db.execute("UPDATE meta SET value = value + 1 WHERE key = 'agents_version'")
+
+    def _require_agent(self, db, name):
+        # A writer holding a deleted agent must not leave orphan rows behind
+        if not db.execute('SELECT 1 FROM agents WHERE name = ?', (name,)).fetchone():
+            raise ValueError("Agent not found")
+
+    def agents_version(self):
+        return self._query("SELECT value FROM meta WHERE key = 'agents_version'")[0][0]
+
+    def load_agents(self):
+        return [json.loads(data) for data, in self._query('SELECT data FROM agents ORDER BY position')]
+
+    def save_agents(self, configs):
+        with self._transaction() as db:
+            db.execute('DELETE FROM agents')
+            db.executemany('INSERT INTO agents (name, data) VALUES (?, ?)', [(c['name'], json.dumps(c)) for c in configs])
+            self._bump_agents_version(db)
+
+    def add_agent(self, config):
+        with self._transaction() as db:
+            try: db.execute('INSERT INTO agents (name, data) VALUES (?, ?)', (config['name'], json.dumps(config)))
+            except sqlite3.IntegrityError: raise ValueError("Agent exists")
+            self._bump_agents_version(db)
+
+    def remove_agent(self, name):
+        with self._transaction() as db:
+            if not db.execute('DELETE FROM agents WHERE name = ?', (name,)).rowcount:
+                raise ValueError("Agent not found")
+            db.execute('DELETE FROM history WHERE agent = ?', (name,))
+            db.execute('DELETE FROM summaries WHERE agent = ?', (name,))
+            self._bump_agents_version(db)
+
+    def load_history(self, name):
+        return [{"role": role, "content": content} for role, content in
+                self._query('SELECT role, content FROM history WHERE agent = ? ORDER BY id', (name,))]
+
+    def save_history(self, name, history):
+        with self._transaction() as db:
+            self._require_agent(db, name)
+            db.execute('DELETE FROM history WHERE agent = ?', (name,))
+            db.executemany('INSERT INTO history (agent, role, content) VALUES (?, ?, ?)',
+                           [(name, m['role'], m['content']) for m in history])
+
+    def append_history(self, name, entries):
+        with self._transaction() as db:
+            self._require_agent(db, name)
+            db.executemany('INSERT INTO history (agent, role, content) VALUES (?, ?, ?)',
+                           [(name, m['role'], m['content']) for m in entries])
+
+    def load_summary(self, name):
+        if rows := self._query('SELECT content FROM summaries WHERE agent = ?', (name,)):
+            return rows[0][0]
+
+    def save_summary(self, name, summary):
+        with self._transaction() as db:
+            self._require_agent(db, name)
+            db.execute('INSERT OR REPLACE INTO summaries (agent, content) VALUES (?, ?)', (name, summary))
+
+    def delete_summary(self, name):
+        with self._transaction() as db:
+            db.execute('DELETE FROM summaries WHERE agent = ?', (name,))
+
+    def incr_metric(self, name, amount):
+        with self._transaction() as db:
+            db.execute('INSERT INTO metrics VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+                       (name, amount))
+
+    def load_metrics(self):
+        return dict(self._query('SELECT name, value FROM metrics'))
+
+class OllamaOptions:
+    """Translates agent settings into the Ollama `options` keys that actually take effect"""
+    RUNTIME_KEYS = ('num_ctx', 'num_thread', 'num_batch')
+    _context_lengths = {}  # model -> trained context length, from /api/show
+
     @staticmethod
-    def find_agent(name, agents):
-        return next((a for a in agents if a.name == name), None)
+    def for_agent(agent, **overrides):
+        options = {'temperature': agent.temperature, 'top_p': agent.top_p, 'num_predict': agent.max_tokens}
+        options.update({k: v for k in OllamaOptions.RUNTIME_KEYS if (v := getattr(agent, k)) is not None})
+        return {**options, **overrides}
+
+    @classmethod
+    def get_context_length(cls, model):
+        """Largest num_ctx the model supports, or None if Ollama can't tell us"""
+        if model not in cls._context_lengths:
+            try:
+                info = OllamaService.http().post(f'{Config.OLLAMA_HOST}/api/show', json={'model': model}, timeout=10).json().get('model_info', {})
+                cls._context_lengths[model] = next((v for k, v in info.items() if k.endswith('.context_length')), None)
+            except Exception: return None  # Don't cache, Ollama may just be down
+        return cls._context_lengths[model]
+
+    @classmethod
+    def validate(cls, agent):
+        if agent.max_tokens < 1: raise ValueError("max_tokens must be at least 1")
+        for key in cls.RUNTIME_KEYS:
+            if (value := getattr(agent, key)) is not None and value < 1:
+                raise ValueError(f"{key} must be at least 1")
+        if agent.num_ctx is not None:
+            if agent.max_tokens >= agent.num_ctx:
+                raise ValueError(f"max_tokens ({agent.max_tokens}) must be smaller than num_ctx ({agent.num_ctx})")
+            if (limit := cls.get_context_length(agent.model)) and agent.num_ctx > limit:
+                raise ValueError(f"num_ctx ({agent.num_ctx}) exceeds {agent.model}'s context length ({limit})")
 
 class OllamaService:
+    _session, _session_lock = None, threading.Lock()
+
+    @classmethod
+    def http(cls):
+        """Shared session, created on first use, so calls to Ollama reuse pooled connections"""
+        with cls._session_lock:
+            if cls._session is None: cls._session = requests.Session()
+            return cls._session
+
+    @staticmethod
+    def warm_up():
+        """Connect to Ollama and load every agent's model, so the first chat doesn't wait for it"""
+        models = {}
+        for config in AgentManager.load_configs():  # First agent's runtime options win, to match its num_ctx
+            models.setdefault(config.get('model', Config.DEFAULT_MODEL),
+                              {k: v for k in OllamaOptions.RUNTIME_KEYS if (v := config.get(k)) is not None})
+        for model, options in models.items():
+            try:
+                OllamaOptions.get_context_length(model)
+                # A generate call without a prompt just loads the model into memory
+                OllamaService.http().post(f'{Config.OLLAMA_HOST}/api/generate', json={'model': model, 'options': options},
+                                          timeout=Config.REQUEST_DEADLINE)
+            except Exception as e: print(f"Error warming up {model}: {e}")
+
     @staticmethod
     def get_available_models():
         try:
-            return [m['name'] for m in requests.get(f'{Config.OLLAMA_HOST}/api/tags').json().get('models', [])]
+            return [m['name'] for m in OllamaService.http().get(f'{Config.OLLAMA_HOST}/api/tags').json().get('models', [])]
         except: return [Config.DEFAULT_MODEL]
     
     @staticmethod
-    def generate_response(agent, messages):
+    def generate_response(agent, messages, cancel_token=None):
+        """Full reply, or None on failure; generated via streaming so it can be aborted midway"""
+        cancel_token = cancel_token or CancelToken(Config.REQUEST_DEADLINE)
+        try:
+            response = ''.join(OllamaService.stream_response(agent, messages, cancel_token))
+            return response if cancel_token.completed and response else None
+        except Exception as e: print(f"Error generating response: {e}"); return None
+
+    @staticmethod
+    def stream_response(agent, messages, cancel_token):
+        """Yield reply tokens as Ollama produces them until done or cancelled"""
+        Metrics.incr('generations_started')
+        try:
+            with OllamaService.http().post(f'{Config.OLLAMA_HOST}/api/chat', stream=True, timeout=cancel_token.timeout, json={
+                'model': agent.model, 'messages': messages, 'stream': True,
+                'options': OllamaOptions.for_agent(agent)
+            }) as resp:
+                cancel_token.attach(resp)
+                resp.raise_for_status()
+                try:
+                    for line in resp.iter_lines(chunk_size=None):  # Ollama sends one chunk per token
+                        if cancel_token.cancelled: return
+                        if not line: continue
+                        chunk = json.loads(line)
+                        if token := chunk.get('message', {}).get('content'): yield token
+                        if chunk.get('done', False): return cancel_token.complete()
+                except Exception:
+                    if not cancel_token.cancelled: raise
+        finally:
+            cancel_token.finish()
+            if cancel_token.completed: Metrics.incr('generations_completed')
+            elif cancel_token.cancelled: Metrics.record_abort(cancel_token.reason)
+            else: Metrics.incr('generations_failed')
+
+class Metrics:
+    """Generation counters, exposed at /api/metrics. They live in the state store, so with
+    SqliteStore they add up across workers; FileStore keeps them per process."""
+    @staticmethod
+    def incr(name, amount=1):
+        try: get_store().incr_metric(name, amount)
+        except Exception as e: print(f"Error recording metric {name}: {e}")
+
+    @classmethod
+    def record_abort(cls, reason):
+        cls.incr('generations_aborted')
+        cls.incr(f'generations_aborted_{reason}')
+
+    @staticmethod
+    def snapshot():
+        return get_store().load_metrics()
+
+class CancelToken:
+    """Lets another thread abort an in-flight Ollama request, and aborts it itself
+    once `timeout` seconds have passed.
+    
+    Dropping the connection is what makes Ollama stop generating, so cancel()
+    shuts the socket down rather than just flagging the reader loop."""
+    def __init__(self, timeout=None):
+        self._event, self._resp = threading.Event(), None
+        self._lock, self.timeout, self.reason = threading.Lock(), timeout, None
+        self.completed = False  # Set once Ollama reports done; anything short of that is a failed reply
+        self._timer = threading.Timer(timeout, self.cancel, args=('deadline',)) if timeout else None
+        if self._timer: self._timer.daemon = True; self._timer.start()
+
+    cancelled = property(lambda self: self._event.is_set())
+
+    def attach(self, resp):
+        with self._lock:
+            self._resp = resp
+            if self.cancelled: self._abort()
+
+    def cancel(self, reason='cancelled'):
+        with self._lock:
+            if self.cancelled or self.completed: return  # First reason wins
+            self.reason = reason
+            self._event.set()
+            if self._resp is not None: self._abort()
+
+    def complete(self):
+        """Mark the reply as fully received, unless it was cancelled first"""
+        with self._lock: self.completed = not self.cancelled
+
+    def finish(self):
+        """Stop the deadline timer once the generation is over"""
+        if self._timer: self._timer.cancel()
+
+    def _abort(self):
+        # Shutting the socket down wakes a reader blocked in recv(); once the body is being
+        # read, urllib3 may have handed the socket over from the connection to the reader
+        raw = self._resp.raw
+        fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+        sock = getattr(raw.connection, 'sock', None) or getattr(getattr(fp, 'raw', None), '_sock', None)
+        try: return sock.shutdown(socket.SHUT_RDWR)  # The reader closes the response as it unwinds
+        except Exception: pass
+        self._resp.close()  # Closing under a blocked reader fails on gevent, so only as a fallback
+
+class ChatSession:
+    """Server-side state for one WebSocket connection: the selected agent stays
+    resident between turns instead of being reloaded from disk on every message."""
+    def __init__(self, ws):
+        self.ws, self.agent, self.version = ws, None, None  # Store agents_version the agent was built at
+        self.worker, self.cancel_token = None, CancelToken()  # Placeholder until the first turn
+        self.send_lock = threading.Lock()
+
+    def send(self, **payload):
+        with self.send_lock:
+            try: self.ws.send(json.dumps(payload))
+            except Exception: self.cancel('client_gone')  # Stop generating for a client that left
+
+    @property
+    def busy(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def select(self, name):
+        if self.busy:  # Switching agents abandons the reply still streaming for the old one
+            self.cancel()
+            self.worker.join()
+        version = get_store().agents_version()
+        if not (agent := AgentManager.get(name)):
+            raise ValueError("Agent not found")
+        self.agent, self.version = agent, version
+        self.send(type='selected', agent=agent.name)
+
+    def chat(self, message):
+        if not self.agent or not message: raise ValueError("Invalid request")
+        if self.busy: raise ValueError("Generation in progress")
+        self.reload()
+        self.cancel_token = CancelToken(Config.REQUEST_DEADLINE)
+        self.worker = threading.Thread(target=self._generate, args=(message, self.cancel_token), daemon=True)
+        self.worker.start()
+
+    def reload(self):
+        """Catch up with changes made elsewhere since the last turn, e.g. an edit, delete or history reset"""
+        if (version := get_store().agents_version()) == self.version:
+            return self.agent.refresh()
+        if not (agent := AgentManager.get(self.agent.name)):
+            self.agent = None
+            raise ValueError("Agent not found")
+        self.agent, self.version = agent, version
+
+    def cancel(self, reason='cancelled'):
+        self.cancel_token.cancel(reason)
+
+    def _generate(self, message, cancel_token):
+        agent, parts = self.agent, []
+        messages = agent.build_messages(message)
         try:
-            resp = requests.post(f'{Config.OLLAMA_HOST}/api/chat', json={
-                'model': agent.model, 'messages': messages, 'stream': False,
-                'options': {'temperature': agent.temperature, 'max_tokens': agent.max_tokens, 'top_p': agent.top_p}
-            })
-            return resp.json()['message']['content'] if resp.ok else None
-        except: return None
+            for token in OllamaService.stream_response(agent, messages, cancel_token):
+                parts.append(token)
+                self.send(type='token', content=token)
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+        if not (cancel_token.completed and parts):
+            agent.history.pop()  # Drop the unanswered user message, also when the reply broke off midway
+            if cancel_token.reason == 'deadline': return self.send(type='error', error="Deadline exceeded")
+            return self.send(type='cancelled') if cancel_token.cancelled else self.send(type='error', error="Model failed")
+        response = ''.join(parts)
+        try: agent.record_response(response)
+        except ValueError as e: return self.send(type='error', error=str(e))  # Deleted while generating
+        self.send(type='done', response=response)
+
+_store = None
 
-app = Flask(__name__)
-CORS(app)
-ensure_directory_exists(Config.HISTORY_DIR)
+def get_store():
+    """State backend, created on first use so importing this module stays cheap"""
+    global _store
+    if _store is None: _store = SqliteStore(Config.STATE_DB) if Config.STATE_DB else FileStore()
+    return _store
+
+api, ui = Blueprint('api', __name__), Blueprint('ui', __name__)
 
 def json_response(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
-        try: return jsonify(f(*args, **kwargs))
+        try:
+            result = f(*args, **kwargs)
+            return result if isinstance(result, Response) else jsonify(result)
+        except TimeoutError as e: return jsonify({'error': str(e)}), 504
         except Exception as e: return jsonify({'error': str(e)}), 500
     return wrapper
 
@@ -227,6 +716,12 @@ def check_required(data, fields):
     if missing := [f for f in fields if not data.get(f)]:
         raise ValueError(f"Missing fields: {', '.join(missing)}")
 
+def request_deadline():
+    """Seconds this request may spend generating: the client's header, capped by the config default"""
+    try: timeout = float(request.headers[Config.DEADLINE_HEADER])
+    except (KeyError, ValueError): return Config.REQUEST_DEADLINE
+    return min(max(timeout, 0.1), Config.REQUEST_DEADLINE) if math.isfinite(timeout) else Config.REQUEST_DEADLINE
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -295,6 +790,7 @@ HTML_TEMPLATE = """
                 <div class="input-box">
                     <input type="text" id="message-input" autocomplete="off" placeholder="Type a message...">
                     <button onclick="sendMessage(event)">Send</button>
+                    <button id="stop-btn" onclick="stopGeneration()" disabled>Stop</button>
                 </div>
             </div>
         </div>
@@ -348,6 +844,28 @@ HTML_TEMPLATE = """
                     </div>
                 </div>
                 
+                <div class="form-group">
+                    <label for="agent-num-ctx">Context Window (num_ctx):</label>
+                    <select id="agent-num-ctx">
+                        <option value="">Model default</option>
+                        <option value="2048">2048</option>
+                        <option value="4096">4096</option>
+                        <option value="8192">8192</option>
+                        <option value="16384">16384</option>
+                        <option value="32768">32768</option>
+                    </select>
+                </div>
+                
+                <div class="form-group">
+                    <label for="agent-num-thread">CPU Threads (num_thread):</label>
+                    <input type="number" id="agent-num-thread" min="1" placeholder="Auto">
+                </div>
+                
+                <div class="form-group">
+                    <label for="agent-num-batch">Prompt Batch Size (num_batch):</label>
+                    <input type="number" id="agent-num-batch" min="1" placeholder="Model default">
+                </div>
+                
                 <div class="form-group">
                     <label for="agent-top-p">Top-p (Diversity of Responses):</label>
                     <div class="slider-container">
@@ -370,11 +888,84 @@ HTML_TEMPLATE = """
         let selectedAgent = null;
         let agents = [];
         let hasConversationHistory = false;
+        let socket = null;
+        let streamingDiv = null;
+        let streamAbort = null;  // AbortController of the /api/chat fallback stream
+        let awaitingSelect = false;
         
         window.onload = async function() {
+            connectSocket();
             await Promise.all([loadAgents(), loadModels()]);
         }
         
+        // Persistent chat channel; falls back to plain HTTP when unavailable
+        function connectSocket() {
+            const ws = new WebSocket(`${location.protocol === 'https:' ? 'wss' : 'ws'}://${location.host}/ws/chat`);
+            ws.onopen = () => {
+                socket = ws;
+                if (selectedAgent) selectSocketAgent(selectedAgent);
+            };
+            ws.onclose = () => {
+                if (socket === ws) socket = null;
+                if (streamingDiv) finishStream();
+            };
+            ws.onmessage = event => handleChatEvent(JSON.parse(event.data));
+        }
+        
+        function selectSocketAgent(agentName) {
+            if (!socket || !agentName) return;
+            awaitingSelect = true;
+            socket.send(JSON.stringify({ type: 'select', agent: agentName }));
+        }
+        
+        function handleChatEvent(data) {
+            if (awaitingSelect) {
+                // Anything before the server confirms belongs to the previous agent's turn
+                if (data.type === 'selected') awaitingSelect = false;
+                else if (data.type === 'error' && data.request === 'select') {
+                    awaitingSelect = false;
+                    refuseSelection(data.error);
+                }
+                return;
+            }
+            if (data.type === 'token') {
+                if (!streamingDiv) streamingDiv = appendMessage('bot', '');
+                streamingDiv.textContent += data.content;
+                const chatBox = document.getElementById('chat-box');
+                chatBox.scrollTop = chatBox.scrollHeight;
+            } else if (data.type === 'done') {
+                if (!streamingDiv) appendMessage('bot', data.response);
+                hasConversationHistory = true;
+                finishStream();
+            } else if (data.type === 'cancelled') {
+                appendMessage('bot', '[Generation stopped]');
+                finishStream();
+            } else if (data.type === 'error') {
+                appendMessage('bot', `Error: ${data.error}`);
+                finishStream();
+            }
+        }
+        
+        function refuseSelection(error) {
+            selectedAgent = null;
+            hasConversationHistory = false;
+            document.getElementById('agent-select').value = '';
+            document.getElementById('agent-info').style.display = 'none';
+            document.getElementById('chat-box').innerHTML = '';
+            document.getElementById('reset-history-btn').disabled = true;
+            alert(`Error: ${error}`);
+        }
+        
+        function finishStream() {
+            streamingDiv = null;
+            document.getElementById('stop-btn').disabled = true;
+        }
+        
+        function stopGeneration() {
+            if (socket) socket.send(JSON.stringify({ type: 'cancel' }));
+            else if (streamAbort) streamAbort.abort();  // Dropping the request stops Ollama too
+        }
+        
         async function loadAgents() {
             const response = await fetch('/api/agents');
             agents = await response.json();
@@ -435,6 +1026,11 @@ HTML_TEMPLATE = """
         }
         
         async function selectAgent(agentName) {
+            if (streamAbort) {
+                streamAbort.abort();
+                streamAbort = null;  // Discard the old agent's reply rather than showing it as stopped
+            }
+            finishStream();
             selectedAgent = agentName;
             document.getElementById('chat-box').innerHTML = '';
             document.getElementById('reset-history-btn').disabled = !agentName;
@@ -445,6 +1041,7 @@ HTML_TEMPLATE = """
                 agentInfo.innerHTML = `<strong>${agent.name}</strong> - ${agent.role}<br>
                     <small>Expertise: ${agent.expertise.substring(0, 100)}${agent.expertise.length > 100 ? '...' : ''}</small>`;
                 agentInfo.style.display = 'block';
+                selectSocketAgent(agentName);
                 await loadConversationHistory(agentName);
             } else {
                 agentInfo.style.display = 'none';
@@ -502,6 +1099,7 @@ HTML_TEMPLATE = """
                 if (response.ok) {
                     document.getElementById('chat-box').innerHTML = '';
                     hasConversationHistory = false;
+                    selectSocketAgent(selectedAgent);
                     alert('Conversation history has been reset.');
                 } else {
                     alert('Failed to reset conversation history.');
@@ -524,6 +1122,7 @@ HTML_TEMPLATE = """
                     if (selectedAgent === agentName) {
                         document.getElementById('chat-box').innerHTML = '';
                         hasConversationHistory = false;
+                        selectSocketAgent(agentName);
                     }
                     alert(`Conversation history for ${agentName} has been reset.`);
                 } else {
@@ -547,7 +1146,10 @@ HTML_TEMPLATE = """
                 model: document.getElementById('agent-model').value,
                 temperature: parseFloat(document.getElementById('agent-temperature').value),
                 max_tokens: parseInt(document.getElementById('agent-max-tokens').value),
-                top_p: parseFloat(document.getElementById('agent-top-p').value)
+                top_p: parseFloat(document.getElementById('agent-top-p').value),
+                num_ctx: document.getElementById('agent-num-ctx').value || null,
+                num_thread: document.getElementById('agent-num-thread').value || null,
+                num_batch: document.getElementById('agent-num-batch').value || null
             };
             
             try {
@@ -564,7 +1166,7 @@ HTML_TEMPLATE = """
                     openTab('chat-tab');
                 } else {
                     const error = await response.json();
-                    alert(`Error: ${error.message}`);
+                    alert(`Error: ${error.error || error.message}`);
                 }
             } catch (error) {
                 console.error('Error:', error);
@@ -621,22 +1223,57 @@ HTML_TEMPLATE = """
             input.value = '';
             appendMessage('user', message);
             
+            if (socket) {
+                document.getElementById('stop-btn').disabled = false;
+                socket.send(JSON.stringify({ type: 'message', message }));
+                return;
+            }
+            
+            // Without WebSockets, stream over HTTP so Stop and closing the tab still reach the server
+            const controller = streamAbort = new AbortController();
+            document.getElementById('stop-btn').disabled = false;
             try {
                 const response = await fetch('/api/chat', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message, agent: selectedAgent })
+                    body: JSON.stringify({ message, agent: selectedAgent, stream: true }),
+                    signal: controller.signal
                 });
+                if (!response.ok) throw new Error((await response.json()).error);
                 
-                const data = await response.json();
-                appendMessage('bot', data.response);
-                hasConversationHistory = true;
+                const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+                let buffered = '';
+                for (;;) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+                    const lines = (buffered + value).split('\\n');
+                    buffered = lines.pop();  // Keep a partial line for the next chunk
+                    for (const line of lines.filter(Boolean)) {
+                        if (streamAbort === controller) handleStreamLine(JSON.parse(line));
+                    }
+                }
             } catch (error) {
-                console.error('Error:', error);
-                appendMessage('bot', 'Error: Could not get response');
+                if (streamAbort !== controller) return;  // Abandoned by switching agents
+                if (error.name === 'AbortError') handleChatEvent({ type: 'cancelled' });
+                else {
+                    console.error('Error:', error);
+                    handleChatEvent({ type: 'error', error: error.message || 'Could not get response' });
+                }
+            } finally {
+                if (streamAbort === controller) {
+                    streamAbort = null;
+                    finishStream();
+                }
             }
         }
         
+        function handleStreamLine(data) {
+            // /api/chat's NDJSON lines carry the same events as the WebSocket channel
+            if ('token' in data) handleChatEvent({ type: 'token', content: data.token });
+            else if (data.done) handleChatEvent({ type: 'done', response: data.response });
+            else if (data.error) handleChatEvent({ type: 'error', error: data.error });
+        }
+        
         function appendMessage(role, content) {
             const chatBox = document.getElementById('chat-box');
             const messageDiv = document.createElement('div');
@@ -644,6 +1281,7 @@ HTML_TEMPLATE = """
             messageDiv.textContent = content;
             chatBox.appendChild(messageDiv);
             chatBox.scrollTop = chatBox.scrollHeight;
+            return messageDiv;
         }
         
         function updateSliderValue(elementId, value) {
@@ -658,102 +1296,168 @@ HTML_TEMPLATE = """
 </html>
 """
 
-@app.route('/')
-def index(): return render_template_string(HTML_TEMPLATE)
+@ui.route('/')
+def index(): return HTML_TEMPLATE  # Plain HTML, so there's no Jinja template to compile
 
-@app.route('/api/agents', methods=['GET', 'POST'])
+@api.route('/api/agents', methods=['GET', 'POST'])
 @json_response
 def manage_agents():
     if request.method == 'GET':
-        return [a.to_dict() for a in AgentManager.load_all()]
+        return AgentManager.load_configs()
     data = request.json
     check_required(data, ['name', 'role', 'temperament', 'expertise', 'communication_style'])
-    agents = AgentManager.load_all()
-    if any(a.name == data['name'] for a in agents):
-        raise ValueError("Agent exists")
-    agents.append(Agent.from_dict(data))
-    AgentManager.save_all(agents)
+    OllamaOptions.validate(agent := Agent.from_dict(data))
+    AgentManager.add(agent)
     return {'message': 'Agent created'}, 201
 
-@app.route('/api/agents/<name>', methods=['DELETE'])
+@api.route('/api/agents/<name>', methods=['DELETE'])
 @json_response
 def delete_agent(name):
-    agents = AgentManager.load_all()
-    if not (agent := AgentManager.find_agent(name, agents)):
-        raise ValueError("Agent not found")
-    
-    # Delete both history and summary files
-    if os.path.exists(agent.history_file):
-        os.remove(agent.history_file)
-    if os.path.exists(agent.summary_file):
-        os.remove(agent.summary_file)
-        
-    AgentManager.save_all([a for a in agents if a.name != name])
+    AgentManager.remove(name)  # Also deletes history and summary
     return {'message': 'Agent deleted'}
 
-@app.route('/api/history/<name>', methods=['GET', 'DELETE'])
+@api.route('/api/history/<name>', methods=['GET', 'DELETE'])
 @json_response
 def handle_history(name):
-    agents = AgentManager.load_all()
-    if not (agent := AgentManager.find_agent(name, agents)):
+    if not (agent := AgentManager.get(name)):
         raise ValueError("Agent not found")
     if request.method == 'DELETE':
         agent.reset_history()
         return {'message': 'History reset'}
     return agent.history
 
-@app.route('/api/models', methods=['GET'])
+@api.route('/api/models', methods=['GET'])
 @json_response
 def get_models(): return OllamaService.get_available_models()
 
-@app.route('/api/chat', methods=['POST'])
+@api.route('/api/chat', methods=['POST'])
 @json_response
 def chat():
     data = request.json
-    agents = AgentManager.load_all()
-    if not (agent := AgentManager.find_agent(data.get('agent'), agents)) or 'message' not in data:
+    if not (agent := AgentManager.get(data.get('agent'))) or 'message' not in data:
         raise ValueError("Invalid request")
     
-    # Add the user message to history
-    agent.history.append({"role": "user", "content": data['message']})
-    
-    agent.load_summary()
-    context_summary = agent.context_summary
-    
-    # Get current topic from the latest message
-    latest_message = data['message']
-    topic = latest_message[:50] + "..." if len(latest_message) > 50 else latest_message
-    
-    # Build minimal context for model
-    # Only include last message for context + system prompt with summary
-    messages = [
-        {"role": "system", "content": agent.get_system_message(topic, context_summary)},
-        *(agent.history[-3:] if len(agent.history) >= 3 else agent.history)
-    ]
+    messages = agent.build_messages(data['message'])
     print(messages)
-    # Update conversation summary
-    
-    if not (response := OllamaService.generate_response(agent, messages)):
-        raise RuntimeError("Model failed")
-    if len(agent.history) % 3 == 0:  # Update only every 5 messages
-        context_summary = agent.update_summary()
+    cancel_token = CancelToken(request_deadline())
     
-    # Add response to history
-    agent.history.append({"role": "assistant", "content": response})
-    agent.save_history()
-    
-    # Make sure to update the agent in the agents file too
-    AgentManager.save_all(agents)
+    if data.get('stream'):
+        return Response(stream_chat(agent, messages, cancel_token), mimetype='application/x-ndjson')
+    if not (response := OllamaService.generate_response(agent, messages, cancel_token)):
+        raise TimeoutError("Deadline exceeded") if cancel_token.reason == 'deadline' else RuntimeError("Model failed")
+    agent.record_response(response)
     
     return {'response': response}
 
+def stream_chat(agent, messages, cancel_token):
+    """NDJSON body for streamed /api/chat; the WSGI server closes it when the client disconnects"""
+    tokens, parts = OllamaService.stream_response(agent, messages, cancel_token), []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield json.dumps({'token': token}) + '\n'
+    except GeneratorExit:
+        cancel_token.cancel('client_gone')
+        raise
+    except Exception as e:
+        print(f"Error streaming response: {e}")
+    finally:
+        tokens.close()
+    if not (cancel_token.completed and parts):
+        agent.history.pop()  # Drop the unanswered user message, as the WebSocket channel does
+        yield json.dumps({'error': "Deadline exceeded" if cancel_token.reason == 'deadline' else "Model failed"}) + '\n'
+        return
+    try: agent.record_response(response := ''.join(parts))
+    except ValueError as e:
+        yield json.dumps({'error': str(e)}) + '\n'
+        return
+    yield json.dumps({'done': True, 'response': response}) + '\n'
+
+@api.route('/api/metrics', methods=['GET'])
+@json_response
+def get_metrics(): return Metrics.snapshot()
+
+def chat_socket(ws):
+    """Persistent chat channel. Client sends {"type": "select"|"message"|"cancel", ...};
+    server replies with "selected", "token", "done", "cancelled" or "error" events."""
+    from flask_sock import ConnectionClosed
+    session = ChatSession(ws)
+    try:
+        while True:
+            raw, data = ws.receive(), {}
+            try:
+                if not isinstance(data := json.loads(raw), dict): raise ValueError("Expected a JSON object")
+                if data.get('type') == 'select': session.select(data.get('agent'))
+                elif data.get('type') == 'message':
+                    if not isinstance(message := data.get('message'), str): raise ValueError("message must be a string")
+                    session.chat(message.strip())
+                elif data.get('type') == 'cancel': session.cancel()
+                else: raise ValueError("Unknown message type")
+            except ValueError as e: session.send(type='error', error=str(e), request=data.get('type') if isinstance(data, dict) else None)
+    except ConnectionClosed:
+        session.cancel('client_gone')  # Abort the upstream request if the browser went away mid-reply
+
+APP_MODES = ('api', 'ui', 'worker')
+
+def create_app(mode='ui'):
+    """Build the app with only what `mode` needs:
+    'api' - the JSON API; 'ui' - the API plus the web page and WebSocket channel;
+    'worker' - 'ui' that also warms up Ollama in the background, for autoscaled serving workers."""
+    if mode not in APP_MODES: raise ValueError(f"Unknown mode: {mode}")
+    get_store()
+    mark_phase('open state store')
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(api)
+    mark_phase('create Flask app')
+    if mode != 'api':
+        app.register_blueprint(ui)
+        try:
+            from flask_sock import Sock  # Optional: enables the /ws/chat channel
+            Sock(app).route('/ws/chat')(chat_socket)
+        except ImportError: pass
+        mark_phase('register UI and WebSocket')
+    if mode == 'worker':
+        threading.Thread(target=OllamaService.warm_up, daemon=True).start()
+        mark_phase('start Ollama warm-up')
+    return app
+
+def __getattr__(name):
+    # `app:app` (gunicorn, flask run) builds the app on first access, in the mode named by APP_MODE
+    if name == 'app':
+        globals()['app'] = create_app(os.environ.get('APP_MODE', 'ui'))
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def profile_startup(app):
+    """Print the time spent in each startup phase, including the first requests a user makes"""
+    client, routes = app.test_client(), {rule.rule for rule in app.url_map.iter_rules()}
+    for path in ('/', '/api/agents'):
+        if path in routes:
+            client.get(path)
+            mark_phase(f'first GET {path}')
+    width = max(len(name) for name, _ in STARTUP_PHASES)
+    for name, seconds in STARTUP_PHASES: print(f"{name:<{width}}  {seconds * 1000:8.1f} ms")
+    print(f"{'total':<{width}}  {sum(seconds for _, seconds in STARTUP_PHASES) * 1000:8.1f} ms")
+
+mark_phase('define app module')
+
 if __name__ == '__main__':
-    if not os.path.exists(Config.AGENTS_FILE):
-        AgentManager.save_all([
-            Agent.from_dict({'name': "Sherlock Holmes", 'role': "Detective", 'temperament': "Analytical", 
-                            'expertise': "Criminology", 'communication_style': "Formal"}),
-            Agent.from_dict({'name': "Marie Curie", 'role': "Scientist", 'temperament': "Determined", 
-                            'expertise': "Physics", 'communication_style': "Evidence-based"})
-        ])
-    app.run(host='0.0.0.0', port=5000)
+    parser = argparse.ArgumentParser(description="Ollama Agent Chat")
+    parser.add_argument('--mode', choices=APP_MODES, default='ui')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="report import and initialization time per phase, then exit")
+    args = parser.parse_args()
+    app = create_app(args.mode)
+    if args.profile_startup:
+        profile_startup(app)
+    else:
+        if not get_store().agents_version():  # Nothing saved yet
+            AgentManager.save_all([
+                Agent.from_dict({'name': "Sherlock Holmes", 'role': "Detective", 'temperament': "Analytical", 
+                                'expertise': "Criminology", 'communication_style': "Formal"}),
+                Agent.from_dict({'name': "Marie Curie", 'role': "Scientist", 'temperament': "Determined", 
+                                'expertise': "Physics", 'communication_style': "Evidence-based"})
+            ])
+        app.run(host='0.0.0.0', port=5000)
     
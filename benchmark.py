@@ -0,0 +1,104 @@
+"""Measure /api/chat throughput as gunicorn workers are added.
+
+Ollama is replaced by an instant stub so the numbers reflect the app's own
+per-request work (agent lookup, prompt building, shared state writes). The stub
+runs in one process per CPU, so its GIL doesn't cap the rate; on a machine with
+few cores it still competes with the workers, so read the speedup as a lower bound.
+
+    python benchmark.py --duration 10 --clients 16
+"""
+import argparse, json, multiprocessing, os, subprocess, sys, tempfile, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+import app
+STARTUP_TIMEOUT = 30  # seconds gunicorn gets to start serving
+
+class StubOllama(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Like Ollama; otherwise keep-alive requests stall on delayed ACKs
+    log_message = lambda self, *args: None
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({'message': {'role': 'assistant', 'content': 'Elementary.'}, 'done': True}).encode() + b'\n'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def client(args):
+    """Send chat requests as one agent until the deadline; returns the number that succeeded"""
+    url, agent, until = args
+    session, done = requests.Session(), 0
+    while time.time() < until:
+        done += session.post(f'{url}/api/chat', json={'agent': agent, 'message': 'Who did it?'}).ok
+    return done
+
+def wait_until_ready(server, url, log_path):
+    """Poll until gunicorn serves requests; exit with its log if it dies or never comes up"""
+    deadline = time.time() + STARTUP_TIMEOUT
+    while True:
+        if server.poll() is not None:
+            problem = f"gunicorn exited with code {server.returncode}"
+        elif time.time() > deadline:
+            problem = f"gunicorn did not start within {STARTUP_TIMEOUT} seconds"
+        else:
+            try:
+                if requests.get(f'{url}/api/agents', timeout=5).ok: return
+            except requests.RequestException: pass
+            time.sleep(0.2)
+            continue
+        with open(log_path) as log: sys.exit(f"{problem}:\n{log.read()}")
+
+def run(workers, clients, duration, port, stub_url, workdir):
+    # A fresh database per run, so later runs don't carry the history written by earlier ones
+    app.SqliteStore(db := os.path.join(workdir, f'state-{workers}.db')).save_agents([{'name': f'bench-{i}',
+        'role': "Detective", 'temperament': "Analytical", 'expertise': "Criminology", 'communication_style': "Formal"}
+        for i in range(clients)])  # One agent per client so workers don't queue on a single history
+    env = {**os.environ, 'AGENT_STATE_DB': db, 'OLLAMA_URL': stub_url}
+    log_path = os.path.join(workdir, f'gunicorn-{workers}.log')
+    with open(log_path, 'w') as log:  # A file rather than a pipe, so a chatty server can't block on it
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                                   '--pythonpath', ROOT, '-w', str(workers), '-b', f'127.0.0.1:{port}', 'app:app'],
+                                  cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(server, url, log_path)
+        until = time.time() + duration
+        with multiprocessing.Pool(clients) as pool:
+            return sum(pool.map(client, [(url, f'bench-{i}', until) for i in range(clients)])) / duration
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10, help="seconds per run")
+    parser.add_argument('--clients', type=int, default=4 * multiprocessing.cpu_count())
+    parser.add_argument('--max-workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), StubOllama)
+    for _ in range(multiprocessing.cpu_count()):  # Forked copies all accept on the one listening socket
+        multiprocessing.get_context('fork').Process(target=stub.serve_forever, daemon=True).start()
+    stub_url = f'http://127.0.0.1:{stub.server_port}'
+
+    with tempfile.TemporaryDirectory() as workdir:
+        counts = [1]
+        while counts[-1] * 2 <= args.max_workers: counts.append(counts[-1] * 2)
+        if counts[-1] != args.max_workers: counts.append(args.max_workers)
+
+        print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+        baseline = None
+        for workers in counts:
+            rate = run(workers, args.clients, args.duration, args.port, stub_url, workdir)
+            baseline = baseline or rate
+            print(f"{workers:>8} {rate:>10.1f} {rate / baseline:>7.2f}x", flush=True)
+
+if __name__ == '__main__':
+    main()
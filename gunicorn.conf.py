@@ -0,0 +1,18 @@
+"""Multi-worker serving: `gunicorn -c gunicorn.conf.py app:app`"""
+import multiprocessing, os
+
+# Workers share agents and history through SQLite instead of per-process JSON files
+os.environ.setdefault('AGENT_STATE_DB', 'agent_state.db')
+# Serving workers warm up Ollama in the background so the first chat after a scale-up isn't slow
+mode = os.environ.setdefault('APP_MODE', 'worker')
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+if mode == 'api':
+    threads = int(os.environ.get('THREADS', 4))  # Requests mostly wait on Ollama, so each worker serves several
+else:
+    # An open /ws/chat socket holds its handler for as long as the browser tab stays open, so a
+    # few tabs would use up a thread pool; gevent gives every connection its own greenlet instead
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+timeout = 150  # Longer than Config.REQUEST_DEADLINE so gunicorn never kills a worker mid-generation
@@ -0,0 +1,81 @@
+"""Shared fixtures: a slow streaming Ollama stub and the app served against it from a temp directory."""
+import json, os, queue, sys, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as chat_app
+
+TOKEN_DELAY = 0.2
+TOKENS = 50  # Long enough that an unaborted stream would outlast every test
+SLACK = 0.5  # Scheduling allowance on top of "about one token"
+
+class SlowOllama(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    log_message = lambda self, *args: None
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path == '/api/show':
+            return self.reply({'model_info': {'llama.context_length': self.server.context_length}})
+        self.server.requests.append(body)
+        if not body.get('stream', True):  # Summaries ask for the whole reply at once
+            return self.reply({'message': {'role': 'assistant', 'content': "Summary."}, 'done': True})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for i in range(self.server.tokens):
+                time.sleep(TOKEN_DELAY)
+                self.write_chunk({'message': {'role': 'assistant', 'content': f'tok{i} '}, 'done': False})
+            if self.server.truncate:  # Die mid-reply, as Ollama does when the model runner crashes
+                self.close_connection = True
+                return
+            self.write_chunk({'message': {'role': 'assistant', 'content': ''}, 'done': True})
+            self.wfile.write(b'0\r\n\r\n')
+            self.server.outcomes.put(('complete', time.monotonic()))
+        except OSError:
+            self.server.outcomes.put(('gone', time.monotonic()))
+            self.close_connection = True
+
+    def reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_chunk(self, data):
+        line = json.dumps(data).encode() + b'\n'
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+        self.wfile.flush()
+
+@pytest.fixture
+def ollama():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowOllama)
+    server.outcomes, server.requests = queue.Queue(), []
+    server.tokens, server.truncate, server.context_length = TOKENS, False, 8192
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def base_url(ollama, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('AGENT_STATE_DB', raising=False)
+    monkeypatch.setattr(chat_app.Config, 'STATE_DB', None)
+    monkeypatch.setattr(chat_app.Config, 'OLLAMA_HOST', f'http://127.0.0.1:{ollama.server_port}')
+    monkeypatch.setattr(chat_app.OllamaOptions, '_context_lengths', {})
+    monkeypatch.setattr(chat_app, '_store', None)  # Fresh files and metrics under tmp_path
+    chat_app.AgentManager.save_all([chat_app.Agent.from_dict({'name': "Sherlock Holmes", 'role': "Detective",
+        'temperament': "Analytical", 'expertise': "Criminology", 'communication_style': "Formal"})])
+    server = make_server('127.0.0.1', 0, chat_app.create_app('ui'), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
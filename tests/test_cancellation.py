@@ -0,0 +1,87 @@
+"""Deadlines, client disconnects and WebSocket cancels must close the upstream Ollama request.
+
+Ollama is replaced by a stub that streams one chunk every TOKEN_DELAY seconds and records
+when it notices that the app has dropped the connection.
+"""
+import json, time
+
+import pytest
+import requests
+
+import app as chat_app
+from conftest import TOKEN_DELAY, TOKENS, SLACK
+
+def upstream_closed_at(ollama):
+    outcome, at = ollama.outcomes.get(timeout=TOKENS * TOKEN_DELAY)
+    assert outcome == 'gone', "upstream request ran to completion"
+    return at
+
+def assert_aborted(reason):
+    for _ in range(20):  # The counter is bumped as the generator unwinds, just after the abort
+        if chat_app.Metrics.snapshot().get(f'generations_aborted_{reason}'): break
+        time.sleep(0.05)
+    metrics = chat_app.Metrics.snapshot()
+    assert metrics.get(f'generations_aborted_{reason}') == 1
+    assert metrics.get('generations_aborted') == 1
+    assert not metrics.get('generations_completed')
+
+def test_deadline_header_closes_upstream(ollama, base_url):
+    deadline = 3 * TOKEN_DELAY
+    started = time.monotonic()
+    resp = requests.post(f'{base_url}/api/chat', json={'agent': "Sherlock Holmes", 'message': "Who did it?"},
+                         headers={'X-Request-Timeout': str(deadline)})
+    assert resp.status_code == 504
+    assert resp.json() == {'error': "Deadline exceeded"}
+    assert upstream_closed_at(ollama) - started < deadline + TOKEN_DELAY + SLACK
+    assert_aborted('deadline')
+
+def test_streaming_client_disconnect_closes_upstream(ollama, base_url):
+    resp = requests.post(f'{base_url}/api/chat', stream=True,
+                         json={'agent': "Sherlock Holmes", 'message': "Who did it?", 'stream': True})
+    lines = resp.iter_lines(chunk_size=None)
+    assert 'token' in json.loads(next(lines))
+    resp.close()
+    closed = time.monotonic()
+    assert upstream_closed_at(ollama) - closed < 2 * TOKEN_DELAY + SLACK  # Noticed at the next token write
+    assert_aborted('client_gone')
+
+def test_websocket_cancel_closes_upstream(ollama, base_url):
+    simple_websocket = pytest.importorskip('simple_websocket')
+    pytest.importorskip('flask_sock')
+    ws = simple_websocket.Client.connect(base_url.replace('http', 'ws', 1) + '/ws/chat')
+    try:
+        ws.send(json.dumps({'type': 'select', 'agent': "Sherlock Holmes"}))
+        assert json.loads(ws.receive(timeout=5))['type'] == 'selected'
+        ws.send(json.dumps({'type': 'message', 'message': "Who did it?"}))
+        assert json.loads(ws.receive(timeout=5))['type'] == 'token'
+        ws.send(json.dumps({'type': 'cancel'}))
+        cancelled = time.monotonic()
+        while (event := json.loads(ws.receive(timeout=5)))['type'] == 'token': pass
+        assert event['type'] == 'cancelled'
+        assert upstream_closed_at(ollama) - cancelled < TOKEN_DELAY + SLACK
+    finally:
+        ws.close()
+    assert_aborted('cancelled')
+
+def test_websocket_select_cancels_turn_in_progress(ollama, base_url):
+    simple_websocket = pytest.importorskip('simple_websocket')
+    pytest.importorskip('flask_sock')
+    chat_app.AgentManager.add(chat_app.Agent.from_dict({'name': "Marie Curie", 'role': "Scientist",
+        'temperament': "Determined", 'expertise': "Physics", 'communication_style': "Evidence-based"}))
+    ws = simple_websocket.Client.connect(base_url.replace('http', 'ws', 1) + '/ws/chat')
+    try:
+        ws.send(json.dumps({'type': 'select', 'agent': "Sherlock Holmes"}))
+        assert json.loads(ws.receive(timeout=5))['type'] == 'selected'
+        ws.send(json.dumps({'type': 'message', 'message': "Who did it?"}))
+        assert json.loads(ws.receive(timeout=5))['type'] == 'token'
+        ws.send(json.dumps({'type': 'select', 'agent': "Marie Curie"}))
+        switched = time.monotonic()
+        while (event := json.loads(ws.receive(timeout=5)))['type'] == 'token': pass
+        assert event['type'] == 'cancelled'
+        assert json.loads(ws.receive(timeout=5)) == {'type': 'selected', 'agent': "Marie Curie"}
+        assert upstream_closed_at(ollama) - switched < TOKEN_DELAY + SLACK
+        ws.send(json.dumps({'type': 'select', 'agent': "Nobody"}))
+        assert json.loads(ws.receive(timeout=5)) == {'type': 'error', 'error': "Agent not found", 'request': 'select'}
+    finally:
+        ws.close()
+    assert chat_app.AgentManager.get("Sherlock Holmes").history == []
@@ -0,0 +1,58 @@
+"""Chat turns are stored only when the reply completed, and only for an agent that still exists."""
+import json, os
+
+import pytest
+import requests
+
+import app as chat_app
+
+AGENT = "Sherlock Holmes"
+
+@pytest.fixture
+def ws(ollama, base_url):
+    simple_websocket = pytest.importorskip('simple_websocket')
+    pytest.importorskip('flask_sock')
+    ollama.tokens = 2  # Short replies, so turns run to completion
+    ws = simple_websocket.Client.connect(base_url.replace('http', 'ws', 1) + '/ws/chat')
+    ws.send(json.dumps({'type': 'select', 'agent': AGENT}))
+    assert json.loads(ws.receive(timeout=5))['type'] == 'selected'
+    yield ws
+    ws.close()
+
+def turn(ws, message):
+    ws.send(json.dumps({'type': 'message', 'message': message}))
+    while (event := json.loads(ws.receive(timeout=5)))['type'] == 'token': pass
+    return event
+
+def test_history_reset_elsewhere_is_not_undone(ollama, ws, base_url):
+    assert turn(ws, "Who did it?")['type'] == 'done'
+    requests.delete(f'{base_url}/api/history/{AGENT}').raise_for_status()
+    assert turn(ws, "And why?")['type'] == 'done'
+    assert [m['content'] for m in ollama.requests[-1]['messages'][1:]] == ["And why?"]
+    assert [m['content'] for m in chat_app.AgentManager.get(AGENT).history] == ["And why?", "tok0 tok1 "]
+
+def test_deleted_agent_is_not_recreated(ws, base_url):
+    requests.delete(f'{base_url}/api/agents/{AGENT}').raise_for_status()
+    assert turn(ws, "Who did it?") == {'type': 'error', 'error': "Agent not found", 'request': 'message'}
+    assert os.listdir(chat_app.Config.HISTORY_DIR) == []
+
+def test_agent_deleted_mid_turn_leaves_no_history(ws, base_url):
+    ws.send(json.dumps({'type': 'message', 'message': "Who did it?"}))
+    assert json.loads(ws.receive(timeout=5))['type'] == 'token'
+    requests.delete(f'{base_url}/api/agents/{AGENT}').raise_for_status()
+    while (event := json.loads(ws.receive(timeout=5)))['type'] == 'token': pass
+    assert event == {'type': 'error', 'error': "Agent not found"}
+    assert not [f for f in os.listdir(chat_app.Config.HISTORY_DIR) if not f.endswith('.lock')]
+
+def test_reply_cut_off_midway_is_not_stored(ollama, ws):
+    ollama.truncate = True
+    assert turn(ws, "Who did it?") == {'type': 'error', 'error': "Model failed"}
+    assert chat_app.AgentManager.get(AGENT).history == []
+    assert chat_app.Metrics.snapshot().get('generations_failed') == 1
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_http_reply_cut_off_midway_is_not_stored(ollama, base_url, stream):
+    ollama.tokens, ollama.truncate = 2, True
+    resp = requests.post(f'{base_url}/api/chat', json={'agent': AGENT, 'message': "Who did it?", 'stream': stream})
+    assert [json.loads(line) for line in resp.iter_lines()][-1] == {'error': "Model failed"}
+    assert chat_app.AgentManager.get(AGENT).history == []
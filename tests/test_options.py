@@ -0,0 +1,37 @@
+"""Agent settings must reach Ollama as the `options` keys it actually reads."""
+import pytest
+import requests
+
+import app as chat_app
+
+AGENT = {'name': "Ada Lovelace", 'role': "Mathematician", 'temperament': "Curious",
+         'expertise': "Computing", 'communication_style': "Precise", 'temperature': 0.5, 'top_p': 0.8}
+
+def create_agent(base_url, **settings):
+    return requests.post(f'{base_url}/api/agents', json={**AGENT, **settings})
+
+def test_chat_sends_num_predict_and_only_set_runtime_options(ollama, base_url):
+    ollama.tokens = 1
+    create_agent(base_url, max_tokens=300, num_ctx=4096, num_thread='').raise_for_status()
+    resp = requests.post(f'{base_url}/api/chat', json={'agent': AGENT['name'], 'message': "Hello"})
+    assert resp.json() == {'response': "tok0 "}
+    assert ollama.requests[-1]['options'] == {'temperature': 0.5, 'top_p': 0.8, 'num_predict': 300, 'num_ctx': 4096}
+
+def test_summary_caps_num_predict_and_keeps_runtime_options(ollama, base_url):
+    create_agent(base_url, max_tokens=300, num_ctx=4096, num_thread=2, num_batch=256).raise_for_status()
+    agent = chat_app.AgentManager.get(AGENT['name'])
+    agent.history = [{'role': 'user', 'content': "Hello"}, {'role': 'assistant', 'content': "Hi"},
+                     {'role': 'user', 'content': "Remember this"}]
+    assert agent.update_summary() == "Summary."
+    assert ollama.requests[-1]['options'] == {'temperature': 0.1, 'top_p': 0.8,
+        'num_predict': chat_app.Config.SUMMARY_MAX_TOKENS, 'num_ctx': 4096, 'num_thread': 2, 'num_batch': 256}
+
+@pytest.mark.parametrize('settings, error', [
+    ({'max_tokens': 4096, 'num_ctx': 4096}, "max_tokens (4096) must be smaller than num_ctx (4096)"),
+    ({'num_ctx': 16384}, "num_ctx (16384) exceeds llama3.2:latest's context length (8192)"),
+    ({'num_batch': 0}, "num_batch must be at least 1"),
+    ({'max_tokens': 0}, "max_tokens must be at least 1"),
+])
+def test_create_agent_rejects_invalid_options(base_url, settings, error):
+    assert create_agent(base_url, model='llama3.2:latest', **settings).json() == {'error': error}
+    assert [a['name'] for a in requests.get(f'{base_url}/api/agents').json()] == ["Sherlock Holmes"]